@@ -1,9 +1,9 @@
 
 
-from PySide6 import QtWidgets
+from PySide6 import QtGui, QtWidgets
 from mapclientplugins.sdsprotocolstep.ui_configuredialog import Ui_ConfigureDialog
 
-from mapclientplugins.sdsprotocolstep.protocols import protocols, is_sds_protocol
+from mapclientplugins.sdsprotocolstep.protocolmodel import ProtocolListModel, ProtocolFilterProxyModel, NO_PROTOCOL_TEXT
 
 
 INVALID_STYLE_SHEET = 'background-color: rgba(239, 0, 0, 50)'
@@ -11,7 +11,6 @@ DEFAULT_STYLE_SHEET = ''
 
 
 def _display_parameter(display_name, parameter):
-    display = ""
     names = []
     name = display_name.lower()
     if name in parameter and parameter[name]:
@@ -19,28 +18,58 @@ def _display_parameter(display_name, parameter):
     elif name + "s" in parameter and parameter[name + "s"]:
         names.extend(parameter[name + "s"])
 
-    if len(names):
-        display += "\n"
-        display += f"## {display_name}"
-        display += "s" if len(names) > 1 else ""
-        display += "\n"
-        for index, n in enumerate(names):
-            display += f"{index + 1}. "
-            if "info" in n:
-                display += f"{n['info']} "
+    if not names:
+        return ""
 
-            details = []
-            if "mimetype" in n:
-                details.append(f"type=**{n['mimetype']}**")
-            if "destination" in n:
-                details.append(f"destination=**{n['destination']}**")
+    lines = ["", f"## {display_name}{'s' if len(names) > 1 else ''}"]
+    for index, n in enumerate(names):
+        line = [f"{index + 1}. "]
+        if "info" in n:
+            line.append(f"{n['info']} ")
 
-            if details:
-                display += f"[{', '.join(details)}]"
+        details = []
+        if "mimetype" in n:
+            details.append(f"type=**{n['mimetype']}**")
+        if "destination" in n:
+            details.append(f"destination=**{n['destination']}**")
 
-            display += "\n"
+        if details:
+            line.append(f"[{', '.join(details)}]")
 
-    return display
+        lines.append("".join(line))
+
+    lines.append("")
+    return "\n".join(lines)
+
+
+def _protocol_description(protocol):
+    """
+    Return the markdown description of the protocol.
+    """
+    return f"# {protocol['name']}\n{protocol['info']}{_display_parameter('Input', protocol)}"
+
+
+_documents = {}
+
+
+def _protocol_document(protocol, font):
+    """
+    Return the rendered description of the protocol, rendering it only
+    once per protocol name and version.  A different protocol object
+    with the same name and version, as registered to replace a protocol,
+    is rendered again.  The documents are not owned by any dialog,
+    so they must not be edited.
+    """
+    key = (protocol['name'], protocol['version'])
+    cached = _documents.get(key)
+    if cached is None or cached[0] is not protocol:
+        document = QtGui.QTextDocument()
+        document.setDefaultFont(font)
+        document.setMarkdown(_protocol_description(protocol))
+        cached = (protocol, document)
+        _documents[key] = cached
+
+    return cached[1]
 
 
 class ConfigureDialog(QtWidgets.QDialog):
@@ -61,26 +90,37 @@ class ConfigureDialog(QtWidgets.QDialog):
         # Set a place holder for a callable that will get set from the step.
         # We will use this method to decide whether the identifier is unique.
         self.identifierOccursCount = None
-        self._protocols = [p for p in protocols if is_sds_protocol(p)]
-        self._ui.comboBoxProtocols.insertItems(0, ["--"] + [p['name'] for p in self._protocols])
+        self._protocol_model = ProtocolListModel(self)
+        self._protocol_model.fetchMore()
+        self._protocol_filter_model = ProtocolFilterProxyModel(self)
+        self._protocol_filter_model.setSourceModel(self._protocol_model)
+        self._ui.comboBoxProtocols.setModel(self._protocol_filter_model)
+        # Shown when no protocol is selected, the rendered descriptions are shared.
+        self._empty_document = QtGui.QTextDocument(self)
+        self._ui.textEditProtocolInfo.setDocument(self._empty_document)
 
         self._make_connections()
 
     def _make_connections(self):
         self._ui.lineEditIdentifier.textChanged.connect(self.validate)
         self._ui.comboBoxProtocols.currentIndexChanged.connect(self._protocol_changed)
+        self._ui.lineEditProtocolFilter.textChanged.connect(self._protocol_filter_changed)
 
     def _protocol_changed(self, index):
-        if index == 0:
-            self._ui.textEditProtocolInfo.clear()
+        proxy_index = self._protocol_filter_model.index(index, 0)
+        current_protocol = self._protocol_model.protocol(self._protocol_filter_model.mapToSource(proxy_index))
+        self._protocol_filter_model.set_pinned_name(None if current_protocol is None else current_protocol['name'])
+        if current_protocol is None:
+            self._ui.textEditProtocolInfo.setDocument(self._empty_document)
         else:
-            current_protocol = self._protocols[index - 1]
-
-            display_importer_parameters = f"# {current_protocol['name']}\n"
-            display_importer_parameters += current_protocol['info']
-            display_importer_parameters += _display_parameter("Input", current_protocol)
+            self._ui.textEditProtocolInfo.setDocument(
+                _protocol_document(current_protocol, self._ui.textEditProtocolInfo.font()))
 
-            self._ui.textEditProtocolInfo.setMarkdown(display_importer_parameters)
+    def _protocol_filter_changed(self, text):
+        if text:
+            # Searching needs the whole registry loaded.
+            self._protocol_model.fetch_all()
+        self._protocol_filter_model.setFilterFixedString(text)
 
     def accept(self):
         """
@@ -113,7 +153,7 @@ class ConfigureDialog(QtWidgets.QDialog):
         else:
             self._ui.lineEditIdentifier.setStyleSheet(INVALID_STYLE_SHEET)
 
-        protocol_valid = self._ui.comboBoxProtocols.currentText() != '--'
+        protocol_valid = self._ui.comboBoxProtocols.currentText() != NO_PROTOCOL_TEXT
         return valid and protocol_valid
 
     def getConfig(self):
@@ -134,4 +174,6 @@ class ConfigureDialog(QtWidgets.QDialog):
         """
         self._previousIdentifier = config['identifier']
         self._ui.lineEditIdentifier.setText(config['identifier'])
+        self._ui.lineEditProtocolFilter.clear()
+        self._protocol_model.fetch_until(config['protocol_name'])
         self._ui.comboBoxProtocols.setCurrentText(config['protocol_name'])
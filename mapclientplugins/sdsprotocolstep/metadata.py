@@ -0,0 +1,181 @@
+"""
+Generate the SDS metadata files for a populated protocol.
+
+All tables are produced by generators over a directory walk and written
+row by row, so memory use does not grow with the size of the dataset.
+"""
+import csv
+import datetime
+import mimetypes
+import os
+
+from mapclientplugins.sdsprotocolstep.protocols import is_sds_protocol
+
+METADATA_VERSION = '2.1.0'
+PRIMARY_DIRECTORY = 'primary'
+SUBJECT_PREFIX = 'sub-'
+SAMPLE_PREFIX = 'sam-'
+
+MANIFEST = 'manifest'
+SUBJECTS = 'subjects'
+SAMPLES = 'samples'
+DATASET_DESCRIPTION = 'dataset_description'
+
+MANIFEST_HEADER = ['filename', 'timestamp', 'description', 'file type', 'additional types']
+SUBJECTS_HEADER = ['subject id', 'pool id', 'subject experimental group', 'age', 'sex', 'species', 'strain']
+SAMPLES_HEADER = ['sample id', 'subject id', 'was derived from', 'pool id', 'sample experimental group',
+                  'sample type', 'sample anatomical location']
+
+FILE_FORMATS = ('csv', 'xlsx')
+
+
+def get_dataset_root(protocol):
+    """
+    Return the dataset root directory of a populated protocol, or None if it is not set.
+    """
+    for obj in protocol['inputs']:
+        if obj['type'] == 'directory' and obj['destination'] == '.':
+            return obj['value']
+
+    return None
+
+
+def walk_files(root, exclude=()):
+    """
+    Yield (relative path, os.DirEntry) for every file below root.
+
+    Only one directory iterator per level is kept open, the entries of a
+    directory are never collected into a list.  Files whose resolved path
+    is the resolved path of a file in exclude are skipped.
+    """
+    excluded = {}
+    for file_name in exclude:
+        directory, name = os.path.split(os.path.realpath(file_name))
+        excluded.setdefault(directory, set()).add(name)
+
+    def excluded_names(directory):
+        return excluded.get(os.path.realpath(directory), ()) if excluded else ()
+
+    stack = [('', os.scandir(root), excluded_names(root))]
+    try:
+        while stack:
+            prefix, iterator, skip = stack[-1]
+            entry = next(iterator, None)
+            if entry is None:
+                iterator.close()
+                stack.pop()
+                continue
+
+            relative_path = f'{prefix}{entry.name}'
+            if entry.is_dir(follow_symlinks=False):
+                stack.append((f'{relative_path}/', os.scandir(entry.path), excluded_names(entry.path)))
+            elif entry.is_file() and entry.name not in skip:
+                yield relative_path, entry
+    finally:
+        for _, iterator, _ in stack:
+            iterator.close()
+
+
+def _prefixed_directories(path, prefix):
+    if not os.path.isdir(path):
+        return
+
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir() and entry.name.startswith(prefix):
+                yield entry
+
+
+def manifest_rows(root, exclude=()):
+    yield MANIFEST_HEADER
+    for relative_path, entry in walk_files(root, exclude):
+        timestamp = datetime.datetime.fromtimestamp(entry.stat().st_mtime, datetime.timezone.utc)
+        extension = os.path.splitext(entry.name)[1]
+        mimetype, _ = mimetypes.guess_type(entry.name)
+        yield [relative_path, timestamp.isoformat(), '', extension, mimetype or '']
+
+
+def subject_rows(root):
+    yield SUBJECTS_HEADER
+    for subject in _prefixed_directories(os.path.join(root, PRIMARY_DIRECTORY), SUBJECT_PREFIX):
+        yield [subject.name] + [''] * (len(SUBJECTS_HEADER) - 1)
+
+
+def sample_rows(root):
+    yield SAMPLES_HEADER
+    for subject in _prefixed_directories(os.path.join(root, PRIMARY_DIRECTORY), SUBJECT_PREFIX):
+        for sample in _prefixed_directories(subject.path, SAMPLE_PREFIX):
+            yield [sample.name, subject.name, subject.name] + [''] * (len(SAMPLES_HEADER) - 3)
+
+
+def _count(rows):
+    # Skip the header.
+    return sum(1 for _ in rows) - 1
+
+
+def dataset_description_rows(protocol, root):
+    yield ['Metadata element', 'Value']
+    yield ['Metadata Version', METADATA_VERSION]
+    yield ['Type', protocol['type']]
+    yield ['Title', '']
+    yield ['Number of subjects', _count(subject_rows(root))]
+    yield ['Number of samples', _count(sample_rows(root))]
+
+
+def _write_csv(file_name, rows):
+    with open(file_name, 'w', newline='') as f:
+        writer = csv.writer(f)
+        for row in rows:
+            writer.writerow(row)
+
+
+def _write_xlsx(file_name, rows):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ImportError('Writing xlsx metadata files requires the openpyxl package.')
+
+    # A write only workbook streams the rows to disk.
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Sheet1')
+    for row in rows:
+        worksheet.append(row)
+    workbook.save(file_name)
+
+
+def write_metadata(protocol, output_directory=None, file_format='csv'):
+    """
+    Write the dataset_description, manifest, subjects and samples tables
+    for a populated protocol.
+
+    :param protocol: Populated SDS protocol with a dataset root directory.
+    :param output_directory: Directory to write the tables to, defaults to the dataset root directory.
+    :param file_format: One of 'csv' or 'xlsx'.
+    :return: List of the files written.
+    """
+    if not is_sds_protocol(protocol):
+        raise ValueError('Not a valid SDS protocol.')
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f"Unknown metadata file format '{file_format}'.")
+
+    root = get_dataset_root(protocol)
+    if root is None or not os.path.isdir(root):
+        raise ValueError('Protocol does not have a valid dataset root directory.')
+
+    if output_directory is None:
+        output_directory = root
+
+    writer = _write_csv if file_format == 'csv' else _write_xlsx
+    names = [DATASET_DESCRIPTION, MANIFEST, SUBJECTS, SAMPLES]
+    file_names = [os.path.join(output_directory, f'{name}.{file_format}') for name in names]
+    tables = [
+        dataset_description_rows(protocol, root),
+        # The output files may be inside the dataset, keep them out of the manifest.
+        manifest_rows(root, file_names),
+        subject_rows(root),
+        sample_rows(root),
+    ]
+    for file_name, rows in zip(file_names, tables):
+        writer(file_name, rows)
+
+    return file_names
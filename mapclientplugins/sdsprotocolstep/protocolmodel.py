@@ -0,0 +1,127 @@
+from PySide6 import QtCore
+
+from mapclientplugins.sdsprotocolstep.protocols import protocols, is_sds_protocol
+
+NO_PROTOCOL_TEXT = '--'
+PROTOCOL_ROLE = QtCore.Qt.ItemDataRole.UserRole + 1
+FETCH_BATCH_SIZE = 50
+
+
+class ProtocolListModel(QtCore.QAbstractListModel):
+    """
+    List model of the available SDS protocols.
+
+    The protocol registry is checked with is_sds_protocol in batches as the
+    view asks for more rows, so a large registry is not filtered up front.
+    The first row is always the 'no protocol' placeholder.
+    """
+
+    def __init__(self, parent=None):
+        super(ProtocolListModel, self).__init__(parent)
+        self._registry = tuple(protocols)
+        self._next = 0
+        self._protocols = []
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return len(self._protocols) + 1
+
+    def data(self, index, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+
+        row = index.row()
+        if role in (QtCore.Qt.ItemDataRole.DisplayRole, QtCore.Qt.ItemDataRole.EditRole):
+            return NO_PROTOCOL_TEXT if row == 0 else self._protocols[row - 1]['name']
+        if role == PROTOCOL_ROLE:
+            return None if row == 0 else self._protocols[row - 1]
+
+        return None
+
+    def protocol(self, index):
+        """
+        Return the protocol at the index, or None for the placeholder.
+        Unlike data() with PROTOCOL_ROLE this returns the protocol object
+        itself rather than a copy converted through QVariant.
+        """
+        if not index.isValid() or index.row() == 0:
+            return None
+
+        return self._protocols[index.row() - 1]
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return False
+
+        return self._next < len(self._registry)
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return
+
+        end = min(self._next + FETCH_BATCH_SIZE, len(self._registry))
+        batch = [p for p in self._registry[self._next:end] if is_sds_protocol(p)]
+        self._next = end
+        if batch:
+            first = len(self._protocols) + 1
+            self.beginInsertRows(QtCore.QModelIndex(), first, first + len(batch) - 1)
+            self._protocols.extend(batch)
+            self.endInsertRows()
+
+    def fetch_all(self):
+        while self.canFetchMore():
+            self.fetchMore()
+
+    def fetch_until(self, name):
+        """
+        Fetch protocols until the protocol with the given name is loaded.
+        Returns True if the protocol was found.
+        """
+        if any(p['name'] == name for p in self._protocols):
+            return True
+
+        while self.canFetchMore():
+            loaded = len(self._protocols)
+            self.fetchMore()
+            if any(p['name'] == name for p in self._protocols[loaded:]):
+                return True
+
+        return False
+
+
+class ProtocolFilterProxyModel(QtCore.QSortFilterProxyModel):
+    """
+    Filters the protocol list by name, always keeping the 'no protocol'
+    placeholder and the pinned protocol, so filtering never removes the
+    current selection.
+    """
+
+    def __init__(self, parent=None):
+        super(ProtocolFilterProxyModel, self).__init__(parent)
+        self.setFilterCaseSensitivity(QtCore.Qt.CaseSensitivity.CaseInsensitive)
+        self._pinned_name = None
+
+    def set_pinned_name(self, name):
+        if name == self._pinned_name:
+            return
+
+        if hasattr(self, 'beginFilterChange'):
+            self.beginFilterChange()
+            self._pinned_name = name
+            self.endFilterChange()
+        else:
+            self._pinned_name = name
+            self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if source_row == 0:
+            return True
+
+        if self._pinned_name is not None:
+            index = self.sourceModel().index(source_row, 0, source_parent)
+            if index.data() == self._pinned_name:
+                return True
+
+        return super(ProtocolFilterProxyModel, self).filterAcceptsRow(source_row, source_parent)
@@ -1,18 +1,50 @@
-import os.path
+import copy
+import json
+import logging
+import mimetypes
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from packaging import version
 
+from mapclientplugins.sdsprotocolstep.storage import default_backend, DIRECTORY, FILE
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+logger = logging.getLogger(__name__)
+
 protocols = []
 
+UNBOUNDED = None
+
+_CARDINALITY_PATTERN = re.compile(r'^\s*(\d+)\s*(?:\.\.\s*(\d+|[Nn*])\s*)?$')
 
-def _create_empty_input(mimetype, info, destination, type_, optional=False):
+
+class ProtocolPopulationError(Exception):
+    """
+    Raised when the data provided does not fulfill a protocol.
+    """
+    pass
+
+
+def _create_empty_input(mimetype, info, destination, type_, optional=False, name=None, max_occurs=1, strict_mimetype=False):
     return {
+        'name': name,
         'mimetype': mimetype,
         'info': info,
         'destination': destination,
         'value': None,
         'type': type_,
         'optional': optional,
+        'min_occurs': 0 if optional else 1,
+        'max_occurs': max_occurs,
+        'strict_mimetype': strict_mimetype,
     }
 
 
@@ -30,11 +62,14 @@ def _create_empty_directory(info, destination):
 
 def _create_empty_dict(info, destination):
     return {
+        'name': None,
         'type': 'dict',
         'info': info,
         'destination': destination,
         'value': None,
-        'optional': False
+        'optional': False,
+        'min_occurs': 1,
+        'max_occurs': 1,
     }
 
 
@@ -98,122 +133,717 @@ def is_sds_protocol(protocol):
 
     try:
         version.parse(protocol['version'])
-    except version.InvalidVersion:
+    except (version.InvalidVersion, TypeError):
         return False
 
     return True
 
 
-def _is_valid_identifier_file(d):
-    return os.path.isfile(d)
+def _is_valid_identifier_file(kind):
+    return kind == FILE
 
 
-def _is_valid_directory(d):
-    return os.path.isdir(d)
+def _is_valid_directory(kind):
+    return kind == DIRECTORY
 
 
-def _is_valid_input(obj, d):
+def _is_valid_input(obj, d, kind):
     if obj['type'] == 'identifier_file':
-        return _is_valid_identifier_file(d)
+        return _is_valid_identifier_file(kind)
     elif obj['type'] == 'directory':
-        return _is_valid_directory(d)
+        return _is_valid_directory(kind)
     elif obj['type'] == 'dict':
         return isinstance(d, dict)
 
     return False
 
 
-def _is_optional_input(obj):
-    return obj['optional']
+def _is_path(d):
+    return isinstance(d, (str, os.PathLike))
 
 
-def _populate_scaffold_protocol(protocol, data):
+def stat_data(data, backend=default_backend):
     """
-    Populates the protocol inputs by matching them with a list of data.
-
-    This function "zips" the data list to the protocol inputs,
-    intelligently skipping optional inputs.
+    Return the storage kind of each data item, None for items that are not
+    paths or do not exist.  All paths are resolved with a single batched call.
     """
+    indices = [j for j, d in enumerate(data) if _is_path(d)]
+    kinds = [None] * len(data)
+    if indices:
+        for j, kind in zip(indices, backend.stat_many([data[j] for j in indices])):
+            kinds[j] = kind
 
-    # We can't have more data items than we have protocol inputs.
-    if len(data) > len(protocol['inputs']):
-        print(f"Error: {len(data)} data items provided, but only {len(protocol['inputs'])} protocol inputs exist.")
-        return False
+    return kinds
 
-    i = 0  # Current protocol input index
-    j = 0  # Current data item index
 
-    # This map will store the successful assignments: {protocol_index: data_index}
-    assignment_map = {}
+def _has_valid_mimetype(obj, d, backend=default_backend):
+    """
+    Check the content of an identifier file against the mimetype of the input.
+    JSON files are parsed, other files are checked against their extension.
+    """
+    if obj['mimetype'] == 'application/json':
+        try:
+            with backend.open(d) as f:
+                json.load(f)
+        except (OSError, UnicodeDecodeError, ValueError):
+            return False
+        return True
 
-    # Loop through every protocol input slot
-    while i < len(protocol['inputs']):
-        obj = protocol['inputs'][i]
+    guessed_type, _ = mimetypes.guess_type(os.fspath(d))
+    return guessed_type == obj['mimetype']
 
-        # Check if we still have data items left to assign
-        if j < len(data):
-            d = data[j]
 
-            # Case 1: The data item is valid for the protocol input
-            if _is_valid_input(obj, d):
-                # Assign this data item to this protocol input
-                assignment_map[i] = j
-                i += 1  # Move to the next protocol input
-                j += 1  # Move to the next data item
+def _input_label(obj):
+    return obj.get('name') or 'N/A'
 
-            # Case 2: The data is NOT valid, BUT the protocol input is optional
-            elif _is_optional_input(obj):
-                # Skip this optional protocol input.
-                # DO NOT increment j. The current data item
-                # will be tested against the *next* protocol input.
-                i += 1
 
-            # Case 3: The data is NOT valid, and the input is NOT optional
-            else:
-                # We have a mandatory input that doesn't match the data.
-                print(f"Error: Data item '{d}' is not valid for mandatory input {i} ('{obj.get('name', 'N/A')}')")
-                return False
+class ProtocolMatcher(object):
+    """
+    Compiled form of a protocol's inputs.
 
-        # Case 4: We have run out of data, but still have protocol inputs left
-        else:
-            # This is only okay if the remaining protocol inputs are all optional.
-            if not _is_optional_input(obj):
-                # We've hit a mandatory input but have no data left.
-                print(f"Error: Ran out of data. Mandatory input {i} ('{obj.get('name', 'N/A')}') was not provided.")
+    Each protocol input becomes a slot that accepts between 'min_occurs'
+    and 'max_occurs' consecutive data items.  Slots are filled in the order
+    they are defined, each taking as many items as it can while still leaving
+    enough items for the slots that follow.
+    """
+
+    def __init__(self, protocol):
+        self._slots = tuple(
+            (
+                obj,
+                obj.get('min_occurs', 0 if obj['optional'] else 1),
+                obj.get('max_occurs', 1),
+                obj.get('strict_mimetype', False) and obj['type'] == 'identifier_file',
+            )
+            for obj in protocol['inputs']
+        )
+
+    def match(self, data, lazy=False, backend=default_backend, kinds=None, content_checks=None):
+        """
+        Match the data list to the protocol slots.
+
+        Returns a list with the data indices assigned to each slot.
+        Raises ProtocolPopulationError if the data does not fulfill the protocol.
+        The kinds of the data items are fetched from the storage backend in
+        one batch unless they are given.  Content check results are stored in,
+        and taken from, the content_checks dict keyed on (data index, mimetype).
+
+        If lazy is True content checks are assumed to pass unless the assignment
+        depends on them.  A content check is only deferred if the protocol
+        could not be fulfilled without the item in its slot, so a failing
+        check would have failed the population anyway.  The assignment is
+        always the one found when all content checks are run.
+        The matcher holds no state between calls, so it may be shared between threads.
+        """
+        if kinds is None:
+            kinds = stat_data(data, backend)
+        if content_checks is None:
+            content_checks = {}
+
+        def check_content(obj, j):
+            key = (j, obj['mimetype'])
+            if key not in content_checks:
+                content_checks[key] = _has_valid_mimetype(obj, data[j], backend)
+            return content_checks[key]
+
+        def is_valid(obj, strict, j):
+            if not _is_valid_input(obj, data[j], kinds[j]):
                 return False
+            if not strict:
+                return True
+            if lazy:
+                return content_checks.get((j, obj['mimetype']), True)
+
+            return check_content(obj, j)
+
+        if not lazy:
+            return self._match(data, is_valid)
+
+        while True:
+            assignment = self._match(data, is_valid)
+            # An item that some valid assignment gives to another slot could
+            # move if its check failed, so its check cannot be deferred.
+            slot_counts = self._slot_counts(len(data), is_valid)
+            undecided = [
+                (obj, j)
+                for (obj, _, _, strict), assigned in zip(self._slots, assignment) if strict
+                for j in assigned
+                if (j, obj['mimetype']) not in content_checks and slot_counts[j] > 1
+            ]
+            if not undecided:
+                return assignment
+
+            for obj, j in undecided:
+                check_content(obj, j)
+
+    def _match(self, data, is_valid):
+        try:
+            return self._match_greedy(data, is_valid)
+        except ProtocolPopulationError:
+            # A slot may have taken items a later slot needs, search for an
+            # assignment that backtracks.  Report the greedy error if there is none.
+            assignment = self._search(len(data), is_valid)
+            if assignment is None:
+                raise
+            return assignment
+
+    def _match_greedy(self, data, is_valid):
+        state = _MatchState(self._slots)
+        for j in range(len(data)):
+            if not state.offer(j, data[j], is_valid):
+                # We must not have any *unused* data items left over.
+                raise ProtocolPopulationError(
+                    f"{len(data) - j} data item(s) were left over (too much data provided).")
+
+        return state.finish()
+
+    def _search(self, item_count, is_valid):
+        """
+        Find an assignment of item_count data items by backtracking, preferring
+        to give as many items as possible to earlier slots.
+        Returns None if there is no valid assignment.
+        """
+        solutions = {}
+
+        def solve(i, j):
+            if i == len(self._slots):
+                return [] if j == item_count else None
+
+            if (i, j) not in solutions:
+                obj, min_occurs, max_occurs, strict = self._slots[i]
+                limit = item_count - j if max_occurs is UNBOUNDED else min(max_occurs, item_count - j)
+                run = 0
+                while run < limit and is_valid(obj, strict, j + run):
+                    run += 1
+
+                solution = None
+                for count in range(run, min_occurs - 1, -1):
+                    rest = solve(i + 1, j + count)
+                    if rest is not None:
+                        solution = [list(range(j, j + count))] + rest
+                        break
+                solutions[(i, j)] = solution
+
+            return solutions[(i, j)]
+
+        return solve(0, 0)
+
+    def _slot_counts(self, item_count, is_valid):
+        """
+        Return, for each data item, the number of slots that hold the item
+        in at least one valid assignment.
+
+        Position (i, j) means slots 0 to i - 1 hold data items 0 to j - 1.
+        One forward pass finds the positions reachable from the start and one
+        backward pass the positions from which all the items can be assigned,
+        a slot can hold an item if it moves between two such positions
+        across the item.  This is linear in the number of slots times items.
+        """
+        slot_count = len(self._slots)
+        runs = []
+        for obj, _, _, strict in self._slots:
+            # Number of consecutive items from j that are valid for the slot.
+            run = [0] * (item_count + 1)
+            for j in range(item_count - 1, -1, -1):
+                if is_valid(obj, strict, j):
+                    run[j] = run[j + 1] + 1
+            runs.append(run)
+
+        def end_range(i, j):
+            # Positions slot i can move to from j, first and last inclusive.
+            _, min_occurs, max_occurs, _ = self._slots[i]
+            longest = runs[i][j] if max_occurs is UNBOUNDED else min(max_occurs, runs[i][j])
+            return j + min_occurs, j + longest
+
+        reachable = [[False] * (item_count + 1) for _ in range(slot_count + 1)]
+        reachable[0][0] = True
+        for i in range(slot_count):
+            changes = [0] * (item_count + 2)
+            for j in range(item_count + 1):
+                if reachable[i][j]:
+                    first, last = end_range(i, j)
+                    if first <= last:
+                        changes[first] += 1
+                        changes[last + 1] -= 1
+            active = 0
+            for j in range(item_count + 1):
+                active += changes[j]
+                reachable[i + 1][j] = active > 0
+
+        # latest[i][j] is the largest position k <= j from which the items
+        # k onwards can fill slots i onwards, or -1 if there is none.
+        latest = [[-1] * (item_count + 1) for _ in range(slot_count + 1)]
+        latest[slot_count][item_count] = item_count
+        for i in range(slot_count - 1, -1, -1):
+            last_completable = -1
+            for j in range(item_count + 1):
+                first, last = end_range(i, j)
+                if first <= last and latest[i + 1][last] >= first:
+                    last_completable = j
+                latest[i][j] = last_completable
+
+        counts = [0] * item_count
+        for i in range(slot_count):
+            changes = [0] * (item_count + 1)
+            for j in range(item_count + 1):
+                if reachable[i][j] and latest[i][j] == j:
+                    first, last = end_range(i, j)
+                    end = latest[i + 1][last]
+                    if end > j:
+                        changes[j] += 1
+                        changes[end] -= 1
+            active = 0
+            for j in range(item_count):
+                active += changes[j]
+                if active > 0:
+                    counts[j] += 1
+
+        return counts
+
+    def assign(self, protocol, data, assignment, lazy=False, backend=default_backend, content_checks=None):
+        """
+        Set the values of the protocol inputs from a previously computed assignment.
+        If lazy is True, inputs with values whose content checks are not in
+        content_checks are replaced with LazyInput objects that run the checks
+        when the value is first read.
+        """
+        if content_checks is None:
+            content_checks = {}
+
+        for i, ((_, _, max_occurs, strict), assigned) in enumerate(zip(self._slots, assignment)):
+            obj = protocol['inputs'][i]
+            if max_occurs == 1:
+                obj['value'] = data[assigned[0]] if assigned else None
+            else:
+                obj['value'] = [data[j] for j in assigned]
+
+            if lazy and strict:
+                unchecked = [data[j] for j in assigned if (j, obj['mimetype']) not in content_checks]
+                if unchecked:
+                    protocol['inputs'][i] = LazyInput(obj, backend, unchecked)
+
+
+class _MatchState(object):
+    """
+    Step-wise greedy assignment of data items to protocol slots.
+    Data items are offered one at a time in order.
+    """
+
+    def __init__(self, slots):
+        self._slots = slots
+        self._i = 0  # Current protocol input index
+        self._assignment = [[]]
 
-            # This input is optional, and we have no data, so just skip it.
-            i += 1
+    def offer(self, j, d, is_valid):
+        """
+        Assign data item j to the current or a following slot.
+
+        Returns False if there is no slot left for the item, raises
+        ProtocolPopulationError if a mandatory slot is skipped.
+        """
+        while self._i < len(self._slots):
+            obj, min_occurs, max_occurs, strict = self._slots[self._i]
+            assigned = self._assignment[-1]
+            if (max_occurs is UNBOUNDED or len(assigned) < max_occurs) and is_valid(obj, strict, j):
+                assigned.append(j)
+                return True
+
+            if len(assigned) < min_occurs:
+                raise ProtocolPopulationError(
+                    f"Data item '{d}' is not valid for mandatory input {self._i} ('{_input_label(obj)}').")
+
+            self._i += 1
+            self._assignment.append([])
 
-    # After the loop, all protocol inputs are accounted for.
-    # We must also check if we have any *unused* data items left over.
-    if j < len(data):
-        print(f"Error: {len(data) - j} data item(s) were left over (too much data provided).")
         return False
 
-    # If we made it here, the mapping is valid. Apply the assignments.
-    for protocol_index, data_index in assignment_map.items():
-        protocol['inputs'][protocol_index]['value'] = data[data_index]
+    def finish(self):
+        """
+        Return the assignment once all data items have been offered.
+        """
+        for i in range(self._i, len(self._slots)):
+            obj, min_occurs, _, _ = self._slots[i]
+            # We have run out of data, this is only okay if the remaining inputs are satisfied.
+            if len(self._assignment[i]) < min_occurs:
+                raise ProtocolPopulationError(
+                    f"Ran out of data. Mandatory input {i} ('{_input_label(obj)}') was not provided.")
+            if i + 1 < len(self._slots):
+                self._assignment.append([])
 
-    return True
+        return self._assignment[:len(self._slots)]
+
+
+class LazyInput(dict):
+    """
+    Protocol input whose content checks are deferred until its value is read.
+
+    The checks run, and their outcome is memoised, when the value is read
+    with ['value'], get('value'), items() or values(), which also covers
+    json.dump.  Copying, pickling or encoding the input with
+    serialization.dumps runs the checks and gives a plain dict.  Each of
+    these raises ProtocolPopulationError if a check fails.  Copying the
+    input with dict() or ** unpacking bypasses the checks.
+    """
+
+    def __init__(self, obj, backend=default_backend, unchecked=None):
+        super(LazyInput, self).__init__(obj)
+        self._backend = backend
+        self._unchecked = unchecked
+        self._resolved = False
+        self._error = None
+
+    def _resolve(self):
+        if not self._resolved:
+            value = self._unchecked
+            if value is None:
+                value = super(LazyInput, self).__getitem__('value')
+            for d in value if isinstance(value, list) else [value]:
+                if not _has_valid_mimetype(self, d, self._backend):
+                    self._error = f"Data item '{d}' does not have mimetype '{self['mimetype']}' " \
+                                  f"required by input '{_input_label(self)}'."
+                    break
+            self._resolved = True
+
+        if self._error is not None:
+            raise ProtocolPopulationError(self._error)
+
+    def __getitem__(self, key):
+        if key == 'value':
+            self._resolve()
+        return super(LazyInput, self).__getitem__(key)
+
+    def get(self, key, default=None):
+        if key == 'value':
+            self._resolve()
+        return super(LazyInput, self).get(key, default)
+
+    def items(self):
+        self._resolve()
+        return super(LazyInput, self).items()
+
+    def values(self):
+        self._resolve()
+        return super(LazyInput, self).values()
+
+    def __reduce__(self):
+        self._resolve()
+        return dict, (dict(self),)
+
+
+_matchers = {}
+_registry_lock = threading.RLock()
+
+
+def get_protocol_matcher(protocol):
+    """
+    Return the compiled matcher for the protocol.
+
+    Matchers of registered protocols are compiled once per protocol object
+    and cached until the protocol is replaced with register_protocol.
+    Protocols that are not registered are compiled on every call, so the
+    cache does not grow with ad-hoc definitions.  A registered protocol must
+    not be changed in place, register it again to recompile its matcher.
+    """
+    entry = _matchers.get(id(protocol))
+    if entry is not None and entry[0] is protocol:
+        return entry[1]
+
+    matcher = ProtocolMatcher(protocol)
+    with _registry_lock:
+        if get_protocol_by_name(protocol.get('name')) is protocol:
+            _matchers[id(protocol)] = (protocol, matcher)
+
+    return matcher
+
+
+def create_protocol_instance(protocol):
+    """
+    Return an independent copy of the protocol that can be populated
+    without affecting the protocol definition.
+    """
+    return copy.deepcopy(protocol)
+
+
+def populate(protocol, data, lazy=False, backend=default_backend):
+    """
+    Populate a new instance of the protocol with the data list.
+
+    The protocol passed in is not modified, which makes this function
+    safe to call concurrently for the same protocol from multiple threads.
+    The protocol may be given as a protocol dict or a protocol name.
+    Returns the populated protocol instance, raises ProtocolPopulationError
+    if the data does not fulfill the protocol.
+
+    With lazy set to True the assignment is decided with cheap existence
+    and type checks only.  Content checks, such as mimetype sniffing, run
+    when an input's value is first read, see LazyInput.
+
+    Paths are resolved through the storage backend, the local filesystem by default.
+    """
+    if isinstance(protocol, str):
+        name = protocol
+        protocol = get_protocol_by_name(name)
+        if protocol is None:
+            raise ProtocolPopulationError(f"Unknown protocol '{name}'.")
+
+    if not is_sds_protocol(protocol):
+        raise ProtocolPopulationError('Not a valid SDS protocol.')
+
+    data = list(data)
+    matcher = get_protocol_matcher(protocol)
+    content_checks = {}
+    assignment = matcher.match(data, lazy, backend, content_checks=content_checks)
+    instance = create_protocol_instance(protocol)
+    matcher.assign(instance, data, assignment, lazy, backend, content_checks)
+    return instance
 
 
 def populate_protocol(protocol, data):
+    """
+    Populate the given protocol in place.  Prefer populate() which
+    leaves the protocol definition untouched.
+    """
     if not is_sds_protocol(protocol):
         return False
 
-    if protocol['name'] == 'SimpleScaffold':
-        return _populate_scaffold_protocol(protocol, data)
+    matcher = get_protocol_matcher(protocol)
+    try:
+        assignment = matcher.match(data)
+    except ProtocolPopulationError as e:
+        logger.error(str(e))
+        return False
+
+    matcher.assign(protocol, data, assignment)
+    return True
 
-    if protocol['name'] == 'ScaffoldedVagus':
-        return _populate_scaffold_protocol(protocol, data)
 
-    return False
+class IncrementalPopulator(object):
+    """
+    Populates a protocol from data items that arrive one at a time.
+
+    The storage kinds of the items are resolved in the background as they
+    are added.  A single worker resolves the queued items in batches, items
+    added while a batch is being resolved join the next batch, so the storage
+    backend receives one batched request per batch rather than one per item.
+    finalise() waits for outstanding batches and then matches the items, in
+    the order they were added, exactly as populate() does.  Content checks
+    run in finalise() and only for items that are candidates for a strict
+    slot, so no more content is read than by populate().
+
+    Adding items only saves time if the caller has other work to do, such as
+    waiting for more items, before it calls finalise().
+    """
+
+    def __init__(self, protocol, lazy=False, backend=default_backend, executor=None, batch_delay=0.01):
+        if isinstance(protocol, str):
+            name = protocol
+            protocol = get_protocol_by_name(name)
+            if protocol is None:
+                raise ProtocolPopulationError(f"Unknown protocol '{name}'.")
+
+        if not is_sds_protocol(protocol):
+            raise ProtocolPopulationError('Not a valid SDS protocol.')
+
+        self._protocol = protocol
+        self._matcher = get_protocol_matcher(protocol)
+        self._lazy = lazy
+        self._backend = backend
+        self._batch_delay = batch_delay
+        self._own_executor = executor is None
+        self._executor = ThreadPoolExecutor(max_workers=1) if executor is None else executor
+        self._condition = threading.Condition()
+        self._items = []
+        self._kinds = []
+        self._queued = 0  # Index of the first item not yet taken for validation.
+        self._validating = False
+        self._error = None
+
+    @property
+    def protocol(self):
+        return self._protocol
+
+    def add(self, item):
+        self.add_all([item])
+
+    def add_all(self, items):
+        """
+        Add data items, their storage kinds are resolved in the background.
+        """
+        items = list(items)
+        if not items:
+            return
+
+        with self._condition:
+            self._items.extend(items)
+            self._kinds.extend([None] * len(items))
+            if not self._validating:
+                self._validating = True
+                self._executor.submit(self._validate_queued)
+
+    def _validate_queued(self):
+        # Give items that arrive together the chance to share a batch.
+        time.sleep(self._batch_delay)
+        while True:
+            with self._condition:
+                start = self._queued
+                end = len(self._items)
+                if start == end or self._error is not None:
+                    self._validating = False
+                    self._condition.notify_all()
+                    return
+
+                items = self._items[start:end]
+                self._queued = end
+
+            try:
+                kinds = stat_data(items, self._backend)
+            except Exception as e:
+                with self._condition:
+                    self._error = ProtocolPopulationError(f"Could not validate data items {items}: {e}")
+                continue
+
+            with self._condition:
+                self._kinds[start:end] = kinds
+
+    def finalise(self):
+        """
+        Wait for outstanding validation and return the populated protocol instance.
+        Raises ProtocolPopulationError if the data does not fulfill the protocol.
+        """
+        try:
+            with self._condition:
+                self._condition.wait_for(lambda: not self._validating)
+                items = list(self._items)
+                kinds = list(self._kinds)
+                error = self._error
+        finally:
+            self.close()
+
+        if error is not None:
+            raise error
+
+        content_checks = {}
+        assignment = self._matcher.match(items, self._lazy, self._backend, kinds, content_checks)
+        instance = create_protocol_instance(self._protocol)
+        self._matcher.assign(instance, items, assignment, self._lazy, self._backend, content_checks)
+        return instance
+
+    def close(self):
+        if self._own_executor:
+            self._executor.shutdown(wait=False)
 
 
 def get_protocol_by_name(name):
-    for p in protocols:
+    for p in tuple(protocols):
         if p['name'] == name:
             return p
 
     return None
+
+
+def parse_cardinality(cardinality):
+    """
+    Parse a cardinality string such as '1', '0..1', '1..N' or '2..5'
+    into a (min_occurs, max_occurs) tuple.  An unbounded maximum is
+    returned as UNBOUNDED.
+    """
+    if cardinality == '*':
+        return 0, UNBOUNDED
+
+    match = _CARDINALITY_PATTERN.match(str(cardinality))
+    if match is None:
+        raise ValueError(f"Invalid cardinality '{cardinality}'.")
+
+    min_occurs = int(match.group(1))
+    upper = match.group(2)
+    if upper is None:
+        max_occurs = min_occurs
+    elif upper in ('N', 'n', '*'):
+        max_occurs = UNBOUNDED
+    else:
+        max_occurs = int(upper)
+
+    if max_occurs == 0 or (max_occurs is not UNBOUNDED and max_occurs < min_occurs):
+        raise ValueError(f"Invalid cardinality '{cardinality}'.")
+
+    return min_occurs, max_occurs
+
+
+def _create_input_from_slot(slot):
+    try:
+        type_ = slot['type']
+    except KeyError:
+        raise ValueError(f"Slot '{slot.get('name', 'N/A')}' does not define a type.")
+
+    min_occurs, max_occurs = parse_cardinality(slot.get('cardinality', '1'))
+    if type_ == 'directory':
+        mimetype = 'inode/directory'
+    elif type_ == 'identifier_file':
+        mimetype = slot.get('mimetype', 'application/octet-stream')
+    elif type_ == 'dict':
+        obj = _create_empty_dict(slot.get('info', ''), slot.get('destination', '.'))
+        obj.update(name=slot.get('name'), optional=min_occurs == 0, min_occurs=min_occurs, max_occurs=max_occurs)
+        return obj
+    else:
+        raise ValueError(f"Slot '{slot.get('name', 'N/A')}' has unknown type '{type_}'.")
+
+    obj = _create_empty_input(mimetype, slot.get('info', ''), slot.get('destination', '.'), type_,
+                              optional=min_occurs == 0, name=slot.get('name'), max_occurs=max_occurs,
+                              strict_mimetype=slot.get('strict_mimetype', False))
+    obj['min_occurs'] = min_occurs
+    return obj
+
+
+def create_protocol_from_definition(definition):
+    """
+    Create a protocol from a declarative definition.
+
+    The definition is a dict with the keys 'version', 'name', 'type', 'info'
+    and 'slots'.  Each slot has a 'name', a 'type' (identifier_file, directory or dict)
+    and optionally 'info', 'destination', 'mimetype', 'strict_mimetype'
+    and 'cardinality' (defaults to '1').
+    """
+    protocol = {
+        'id': definition.get('id', 'sds-protocol'),
+        'version': definition.get('version'),
+        'name': definition.get('name'),
+        'type': definition.get('type', 'computational'),
+        'info': definition.get('info', ''),
+        'inputs': [_create_input_from_slot(slot) for slot in definition.get('slots', [])],
+    }
+
+    if not is_sds_protocol(protocol) or not protocol['name']:
+        raise ValueError(f"Definition '{protocol['name']}' is not a valid SDS protocol.")
+
+    return protocol
+
+
+def load_protocol_definition(file_name):
+    """
+    Load a protocol from a JSON or TOML definition file.
+    """
+    if file_name.lower().endswith('.toml'):
+        if tomllib is None:
+            raise ValueError('Loading TOML protocol definitions requires Python 3.11 or later.')
+        with open(file_name, 'rb') as f:
+            definition = tomllib.load(f)
+    else:
+        with open(file_name) as f:
+            definition = json.load(f)
+
+    return create_protocol_from_definition(definition)
+
+
+def register_protocol(protocol):
+    """
+    Add a protocol to the list of available protocols, replacing any
+    existing protocol with the same name.  The matcher of the protocol is
+    compiled here and the matcher of a replaced protocol is dropped.
+    """
+    with _registry_lock:
+        existing = get_protocol_by_name(protocol['name'])
+        if existing is not None:
+            protocols.remove(existing)
+            _matchers.pop(id(existing), None)
+        protocols.append(protocol)
+        _matchers[id(protocol)] = (protocol, ProtocolMatcher(protocol))
@@ -0,0 +1,145 @@
+"""
+Compact binary encoding of populated protocols for passing between processes.
+
+The encoding starts with a magic number and a format version, followed by a
+pickle (protocol 5) payload.  By default only the protocol name, version and
+input values are encoded; the receiving process recreates the rest of the
+protocol from its own registry.  Bytes-like values of at least
+OUT_OF_BAND_THRESHOLD bytes, either as a slot value or directly inside a
+dict or list slot value, are emitted as out-of-band buffers when a
+buffer_callback is given, so they are never copied into the payload.
+
+Decoded out-of-band values are memoryviews of the buffers given to loads,
+so they are not copied on the receiving side either.  They compare equal
+to the original bytes-like values.  Memoryviews that were serialized
+in-band are decoded as bytes or bytearray.
+
+Decoding unpickles the payload, which can run arbitrary code.  Only decode
+data produced by dumps in a trusted process, the header check does not
+make untrusted data safe to decode.
+"""
+import pickle
+import struct
+
+from mapclientplugins.sdsprotocolstep.protocols import create_protocol_instance, get_protocol_by_name, \
+    is_sds_protocol, ProtocolPopulationError
+
+MAGIC = b'SDSP'
+FORMAT_VERSION = 1
+OUT_OF_BAND_THRESHOLD = 64 * 1024
+
+_HEADER = struct.Struct('>4sB')
+_BUFFER_TYPES = (bytes, bytearray, memoryview)
+
+
+def _wrap_buffer(value):
+    if isinstance(value, memoryview):
+        # Memoryviews cannot be pickled directly, whatever their size.
+        return pickle.PickleBuffer(value if value.contiguous else value.tobytes())
+    if isinstance(value, (bytes, bytearray)) and len(value) >= OUT_OF_BAND_THRESHOLD:
+        return pickle.PickleBuffer(value)
+
+    return value
+
+
+def _wrap_buffers(value):
+    """
+    Wrap large bytes-like slot values, and large bytes-like items directly
+    inside dict or list slot values, with pickle.PickleBuffer.  Deeper levels
+    are not searched to keep encoding of large provenance records cheap.
+    """
+    if isinstance(value, dict):
+        wrapped = {k: _wrap_buffer(v) for k, v in value.items() if isinstance(v, _BUFFER_TYPES)}
+        return {**value, **wrapped} if wrapped else value
+    if isinstance(value, list):
+        if any(isinstance(v, _BUFFER_TYPES) for v in value):
+            return [_wrap_buffer(v) for v in value]
+        return value
+
+    return _wrap_buffer(value)
+
+
+def _unwrap_buffer(value):
+    if isinstance(value, pickle.PickleBuffer):
+        return memoryview(value)
+
+    return value
+
+
+def _unwrap_buffers(value):
+    """
+    Turn the out-of-band buffers in a decoded value into memoryviews,
+    at the same levels that _wrap_buffers wraps them.
+    """
+    if isinstance(value, dict):
+        unwrapped = {k: _unwrap_buffer(v) for k, v in value.items() if isinstance(v, pickle.PickleBuffer)}
+        if unwrapped:
+            value.update(unwrapped)
+        return value
+    if isinstance(value, list):
+        if any(isinstance(v, pickle.PickleBuffer) for v in value):
+            return [_unwrap_buffer(v) for v in value]
+        return value
+
+    return _unwrap_buffer(value)
+
+
+def dumps(protocol, buffer_callback=None, include_definition=False):
+    """
+    Encode a populated protocol to bytes.
+
+    :param protocol: Populated protocol to encode.
+    :param buffer_callback: Passed on to pickle, called with each out-of-band buffer.
+      If it is None all buffers are serialized in-band.
+    :param include_definition: Encode the whole protocol instead of only its values,
+      for protocols that are not registered in the receiving process.
+    """
+    if not is_sds_protocol(protocol):
+        raise ValueError('Not a valid SDS protocol.')
+
+    values = [_wrap_buffers(obj['value']) for obj in protocol['inputs']]
+    if include_definition:
+        definition = {k: v for k, v in protocol.items() if k != 'inputs'}
+        definition['inputs'] = [{k: v for k, v in obj.items() if k != 'value'} for obj in protocol['inputs']]
+    else:
+        definition = None
+
+    payload = (protocol['name'], protocol['version'], definition, values)
+    return _HEADER.pack(MAGIC, FORMAT_VERSION) + pickle.dumps(payload, protocol=5, buffer_callback=buffer_callback)
+
+
+def loads(data, buffers=None):
+    """
+    Decode a protocol encoded with dumps.
+
+    The payload is unpickled, which can run arbitrary code, so only decode
+    data from trusted processes.  Checking the header does not protect against this.
+
+    :param data: Bytes-like encoded protocol.
+    :param buffers: The out-of-band buffers collected by the buffer_callback given to dumps.
+      Values decoded from pickle.PickleBuffer objects are returned as memoryviews.
+    """
+    data = memoryview(data)
+    if data.nbytes < _HEADER.size:
+        raise ValueError('Data is too short to be an encoded protocol.')
+
+    magic, format_version = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Data is not an encoded protocol.')
+    if format_version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported encoded protocol format version {format_version}.')
+
+    name, version, definition, values = pickle.loads(data[_HEADER.size:], buffers=buffers)
+    if definition is None:
+        definition = get_protocol_by_name(name)
+        if definition is None or definition['version'] != version:
+            raise ProtocolPopulationError(f"Protocol '{name}' version {version} is not available.")
+
+    protocol = create_protocol_instance(definition)
+    if len(values) != len(protocol['inputs']):
+        raise ValueError(f"Encoded values do not match the inputs of protocol '{name}'.")
+
+    for obj, value in zip(protocol['inputs'], values):
+        obj['value'] = _unwrap_buffers(value)
+
+    return protocol
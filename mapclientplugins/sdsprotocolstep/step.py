@@ -3,13 +3,16 @@
 MAP Client Plugin Step
 """
 import json
+import logging
 
 from PySide6 import QtGui
 
 from mapclient.mountpoints.workflowstep import WorkflowStepMountPoint
 from mapclientplugins.sdsprotocolstep.configuredialog import ConfigureDialog
 
-from mapclientplugins.sdsprotocolstep.protocols import get_protocol_by_name, populate_protocol
+from mapclientplugins.sdsprotocolstep.protocols import populate, ProtocolPopulationError
+
+logger = logging.getLogger(__name__)
 
 
 class SDSProtocolStep(WorkflowStepMountPoint):
@@ -43,7 +46,8 @@ class SDSProtocolStep(WorkflowStepMountPoint):
                       ])
         # Port data:
         self._portData0 = None  # http://physiomeproject.org/workflow/1.0/rdf-schema#sds_protocol
-        self._portData1 = None  # http://physiomeproject.org/workflow/1.0/rdf-schema#file_location
+        # file_location and directory_location data, collected until the step is executed.
+        self._portData1 = []  # http://physiomeproject.org/workflow/1.0/rdf-schema#file_location
         # Config:
         self._config = {
             'identifier': '',
@@ -58,10 +62,13 @@ class SDSProtocolStep(WorkflowStepMountPoint):
         """
         # Put your execute step code here before calling the '_doneExecution' method.
 
-        protocol = get_protocol_by_name(self._config['protocol_name'])
         self._portData0 = None
-        if populate_protocol(protocol, self._portData1):
-            self._portData0 = protocol
+        try:
+            self._portData0 = populate(self._config['protocol_name'], self._portData1)
+        except ProtocolPopulationError as e:
+            logger.error(f"Could not populate protocol '{self._config['protocol_name']}': {e}")
+        finally:
+            self._portData1 = []
 
         self._doneExecution()
 
@@ -76,7 +83,7 @@ class SDSProtocolStep(WorkflowStepMountPoint):
         """
         if not isinstance(data_in, list):
             data_in = [data_in]
-        self._portData1 = data_in  # http://physiomeproject.org/workflow/1.0/rdf-schema#file_location
+        self._portData1.extend(data_in)  # http://physiomeproject.org/workflow/1.0/rdf-schema#file_location
 
     def getPortData(self, index):
         """
@@ -0,0 +1,169 @@
+"""
+Storage backends used to resolve protocol inputs.
+
+A backend answers batched queries so that remote stores can validate all
+the inputs of a protocol in a few requests instead of one per path.
+"""
+import bisect
+import io
+import os
+import stat
+import threading
+
+FILE = 'file'
+DIRECTORY = 'directory'
+
+
+class StorageBackend(object):
+    """
+    Interface for the storage holding the protocol inputs.
+
+    Backends may hold a connection that is reused for every call,
+    close() releases it.  Backends can be used as context managers.
+    """
+
+    def stat_many(self, paths):
+        """
+        Return the kind of each path, FILE, DIRECTORY or None if the path does not exist.
+        """
+        raise NotImplementedError
+
+    def exists_many(self, paths):
+        return [kind is not None for kind in self.stat_many(paths)]
+
+    def list_many(self, paths):
+        """
+        Return the names of the entries in each directory, or None if the path is not a directory.
+        """
+        raise NotImplementedError
+
+    def open(self, path):
+        """
+        Return a binary file object with the content of the file at path.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    Storage backend for the local filesystem.
+    """
+
+    def stat_many(self, paths):
+        kinds = []
+        for path in paths:
+            try:
+                mode = os.stat(path).st_mode
+            except (OSError, ValueError):
+                kinds.append(None)
+                continue
+
+            if stat.S_ISDIR(mode):
+                kinds.append(DIRECTORY)
+            elif stat.S_ISREG(mode):
+                kinds.append(FILE)
+            else:
+                kinds.append(None)
+
+        return kinds
+
+    def list_many(self, paths):
+        names = []
+        for path in paths:
+            try:
+                names.append(os.listdir(path))
+            except (OSError, ValueError):
+                names.append(None)
+
+        return names
+
+    def open(self, path):
+        return open(path, 'rb')
+
+
+class MemoryObjectStoreBackend(StorageBackend):
+    """
+    In-process fake of an object store, for testing.
+
+    Objects are stored under '/' separated keys, directories exist implicitly
+    as key prefixes.  Every call counts as one request to the store and the
+    first request opens the connection that later requests reuse.
+    """
+
+    def __init__(self, objects=None):
+        self._objects = dict(objects or {})
+        self._keys = sorted(self._objects)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self._connected = False
+
+    def _request(self):
+        with self._lock:
+            if not self._connected:
+                self._connected = True
+                self.connections += 1
+            self.requests += 1
+
+    def put(self, key, content):
+        with self._lock:
+            if key not in self._objects:
+                bisect.insort(self._keys, key)
+            self._objects[key] = content
+
+    def _has_prefix(self, prefix):
+        index = bisect.bisect_left(self._keys, prefix)
+        return index < len(self._keys) and self._keys[index].startswith(prefix)
+
+    def stat_many(self, paths):
+        self._request()
+        kinds = []
+        for path in paths:
+            path = str(path)
+            if path in self._objects:
+                kinds.append(FILE)
+            elif self._has_prefix(path.rstrip('/') + '/'):
+                kinds.append(DIRECTORY)
+            else:
+                kinds.append(None)
+
+        return kinds
+
+    def _list(self, path):
+        prefix = str(path).rstrip('/') + '/'
+        names = []
+        index = bisect.bisect_left(self._keys, prefix)
+        while index < len(self._keys) and self._keys[index].startswith(prefix):
+            name = self._keys[index][len(prefix):].split('/', 1)[0]
+            if not names or names[-1] != name:
+                names.append(name)
+            index += 1
+
+        return names or None
+
+    def list_many(self, paths):
+        self._request()
+        return [self._list(path) for path in paths]
+
+    def open(self, path):
+        self._request()
+        try:
+            return io.BytesIO(self._objects[str(path)])
+        except KeyError:
+            raise FileNotFoundError(path)
+
+    def close(self):
+        with self._lock:
+            self._connected = False
+
+
+default_backend = LocalStorageBackend()
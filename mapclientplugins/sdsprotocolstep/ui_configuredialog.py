@@ -51,11 +51,17 @@ class Ui_ConfigureDialog(object):
 
         self.formLayout.setWidget(1, QFormLayout.FieldRole, self.comboBoxProtocols)
 
+        self.lineEditProtocolFilter = QLineEdit(self.configGroupBox)
+        self.lineEditProtocolFilter.setObjectName(u"lineEditProtocolFilter")
+        self.lineEditProtocolFilter.setClearButtonEnabled(True)
+
+        self.formLayout.setWidget(2, QFormLayout.FieldRole, self.lineEditProtocolFilter)
+
         self.textEditProtocolInfo = QTextEdit(self.configGroupBox)
         self.textEditProtocolInfo.setObjectName(u"textEditProtocolInfo")
         self.textEditProtocolInfo.setReadOnly(True)
 
-        self.formLayout.setWidget(2, QFormLayout.SpanningRole, self.textEditProtocolInfo)
+        self.formLayout.setWidget(3, QFormLayout.SpanningRole, self.textEditProtocolInfo)
 
 
         self.gridLayout.addWidget(self.configGroupBox, 0, 0, 1, 1)
@@ -80,5 +86,6 @@ class Ui_ConfigureDialog(object):
         self.configGroupBox.setTitle("")
         self.labelIdentifier.setText(QCoreApplication.translate("ConfigureDialog", u"identifier:  ", None))
         self.labelProtocol.setText(QCoreApplication.translate("ConfigureDialog", u"Protocol:  ", None))
+        self.lineEditProtocolFilter.setPlaceholderText(QCoreApplication.translate("ConfigureDialog", u"Filter protocols", None))
     # retranslateUi
 
@@ -0,0 +1,78 @@
+"""
+Compare the binary protocol encoding with the JSON path for size and speed.
+
+Run from the repository root with:
+
+    python -m tests.benchmark_serialization
+"""
+import base64
+import json
+import os
+import tempfile
+import timeit
+
+from mapclientplugins.sdsprotocolstep import serialization
+from mapclientplugins.sdsprotocolstep.protocols import populate
+
+REPEAT = 5
+
+
+def _scaffold_data(root):
+    web = os.path.join(root, 'web')
+    os.mkdir(web)
+    files = []
+    for n in range(4):
+        file_name = os.path.join(root, f'settings-{n}.json')
+        with open(file_name, 'w') as f:
+            f.write('{}')
+        files.append(file_name)
+
+    return [root] + files + [web]
+
+
+def _best(function):
+    return min(timeit.repeat(function, number=1, repeat=REPEAT))
+
+
+def _binary(instance):
+    buffers = []
+    encoded = serialization.dumps(instance, buffer_callback=buffers.append)
+    encode_time = _best(lambda: serialization.dumps(instance, buffer_callback=[].append))
+    decode_time = _best(lambda: serialization.loads(encoded, buffers=buffers))
+    size = len(encoded) + sum(memoryview(b).nbytes for b in buffers)
+    return len(encoded), size, encode_time, decode_time
+
+
+def _json(instance):
+    encoded = json.dumps(instance)
+    encode_time = _best(lambda: json.dumps(instance))
+    decode_time = _best(lambda: json.loads(encoded))
+    return len(encoded), len(encoded), encode_time, decode_time
+
+
+def _report(label, payload_size, total_size, encode_time, decode_time):
+    print(f'{label:<28} payload {payload_size:>12,} B  total {total_size:>12,} B  '
+          f'encode {encode_time * 1e3:8.1f} ms  decode {decode_time * 1e3:8.1f} ms')
+
+
+def main():
+    with tempfile.TemporaryDirectory() as root:
+        data = _scaffold_data(root)
+        for steps in (100, 10000, 100000):
+            provenance = {'steps': [{'id': k, 'name': f'step {k}', 'parameters': list(range(10))}
+                                    for k in range(steps)]}
+            instance = populate('SimpleScaffold', data + [provenance])
+            print(f'Provenance with {steps} steps:')
+            _report('  binary', *_binary(instance))
+            _report('  json', *_json(instance))
+
+        blob = os.urandom(16 * 1024 * 1024)
+        instance = populate('SimpleScaffold', data + [{'blob': blob}])
+        json_instance = populate('SimpleScaffold', data + [{'blob': base64.b64encode(blob).decode()}])
+        print('Provenance with a 16 MiB blob:')
+        _report('  binary (out-of-band)', *_binary(instance))
+        _report('  json (base64)', *_json(json_instance))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import copy
+import os
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6 import QtWidgets
+
+from mapclientplugins.sdsprotocolstep.configuredialog import ConfigureDialog, _protocol_document
+from mapclientplugins.sdsprotocolstep.protocols import get_protocol_by_name, register_protocol
+
+
+@pytest.fixture(scope='module')
+def application():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def dialog(application):
+    dlg = ConfigureDialog()
+    dlg.identifierOccursCount = lambda identifier: 0
+    dlg.setConfig({'identifier': 'protocol', 'protocol_name': 'SimpleScaffold'})
+    yield dlg
+    dlg.deleteLater()
+
+
+def test_filter_keeps_current_selection(dialog):
+    dialog._ui.lineEditProtocolFilter.setText('Vagus')
+    assert dialog._ui.comboBoxProtocols.currentText() == 'SimpleScaffold'
+    assert dialog.getConfig()['protocol_name'] == 'SimpleScaffold'
+    assert dialog.validate()
+
+    dialog._ui.lineEditProtocolFilter.setText('no such protocol')
+    assert dialog._ui.comboBoxProtocols.currentText() == 'SimpleScaffold'
+
+    dialog._ui.lineEditProtocolFilter.clear()
+    assert dialog._ui.comboBoxProtocols.currentText() == 'SimpleScaffold'
+    assert dialog._ui.comboBoxProtocols.count() == 3
+
+
+def test_filter_hides_other_protocols(dialog):
+    dialog._ui.comboBoxProtocols.setCurrentIndex(0)
+    dialog._ui.lineEditProtocolFilter.setText('vagus')
+    names = [dialog._ui.comboBoxProtocols.itemText(i) for i in range(dialog._ui.comboBoxProtocols.count())]
+    assert names == ['--', 'ScaffoldedVagus']
+
+
+def _description(dialog):
+    return dialog._ui.textEditProtocolInfo.toPlainText()
+
+
+def test_description_documents_are_rendered_once(dialog):
+    document = dialog._ui.textEditProtocolInfo.document()
+    assert 'Scaffold based SPARC dataset' in _description(dialog)
+
+    dialog._ui.comboBoxProtocols.setCurrentIndex(0)
+    assert _description(dialog) == ''
+    assert document.toPlainText() != ''
+
+    dialog.setConfig({'identifier': 'protocol', 'protocol_name': 'SimpleScaffold'})
+    assert dialog._ui.textEditProtocolInfo.document() is document
+
+
+def test_description_follows_replaced_protocol(dialog):
+    original = get_protocol_by_name('ScaffoldedVagus')
+    font = dialog.font()
+    document = _protocol_document(original, font)
+    assert 'Vagus scaffolds' in document.toPlainText()
+    assert _protocol_document(original, font) is document
+
+    replacement = copy.deepcopy(original)
+    replacement['info'] = 'Replacement information.'
+    register_protocol(replacement)
+    try:
+        assert 'Replacement information.' in _protocol_document(replacement, font).toPlainText()
+    finally:
+        register_protocol(original)
+
+    assert 'Vagus scaffolds' in _protocol_document(original, font).toPlainText()
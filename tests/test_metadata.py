@@ -0,0 +1,124 @@
+import csv
+import os
+
+import pytest
+
+from mapclientplugins.sdsprotocolstep import metadata
+from mapclientplugins.sdsprotocolstep.protocols import populate
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    root = tmp_path / 'dataset'
+    for subject in range(2):
+        for sample in range(3):
+            directory = root / 'primary' / f'sub-{subject}' / f'sam-{sample}'
+            directory.mkdir(parents=True)
+            (directory / 'data.json').write_text('{}')
+    (root / 'primary' / 'other').mkdir()
+    (root / 'readme.txt').write_text('readme')
+    return root
+
+
+def _read_csv(file_name):
+    with open(file_name, newline='') as f:
+        return list(csv.reader(f))
+
+
+def test_write_csv_metadata(dataset):
+    instance = populate('ScaffoldedVagus', [str(dataset)])
+    file_names = metadata.write_metadata(instance)
+    assert [os.path.basename(f) for f in file_names] == [
+        'dataset_description.csv', 'manifest.csv', 'subjects.csv', 'samples.csv']
+
+    description = dict(_read_csv(dataset / 'dataset_description.csv')[1:])
+    assert description['Number of subjects'] == '2'
+    assert description['Number of samples'] == '6'
+
+    manifest = _read_csv(dataset / 'manifest.csv')
+    assert manifest[0] == metadata.MANIFEST_HEADER
+    rows = {row[0]: row for row in manifest[1:]}
+    assert sorted(rows) == ['primary/sub-0/sam-0/data.json', 'primary/sub-0/sam-1/data.json',
+                            'primary/sub-0/sam-2/data.json', 'primary/sub-1/sam-0/data.json',
+                            'primary/sub-1/sam-1/data.json', 'primary/sub-1/sam-2/data.json', 'readme.txt']
+    assert rows['readme.txt'][3:] == ['.txt', 'text/plain']
+
+    subjects = _read_csv(dataset / 'subjects.csv')
+    assert subjects[0] == metadata.SUBJECTS_HEADER
+    assert sorted(row[0] for row in subjects[1:]) == ['sub-0', 'sub-1']
+
+    samples = _read_csv(dataset / 'samples.csv')
+    assert samples[0] == metadata.SAMPLES_HEADER
+    assert sorted(row[:2] for row in samples[1:]) == sorted(
+        [f'sam-{sample}', f'sub-{subject}'] for subject in range(2) for sample in range(3))
+
+
+def test_manifest_excludes_output_files_inside_dataset(dataset):
+    instance = populate('ScaffoldedVagus', [str(dataset)])
+    output_directory = dataset / 'primary'
+    metadata.write_metadata(instance, str(output_directory))
+    metadata.write_metadata(instance, str(output_directory))
+
+    listed = [row[0] for row in _read_csv(output_directory / 'manifest.csv')[1:]]
+    assert not any(os.path.dirname(name) == 'primary' for name in listed)
+    assert len(listed) == 7
+
+
+def test_manifest_is_streamed(dataset, monkeypatch):
+    depth = 12
+    directory = dataset
+    for level in range(depth):
+        directory = directory / f'level-{level}'
+        directory.mkdir()
+        for n in range(5):
+            (directory / f'file-{n}.txt').write_text('')
+
+    open_iterators = []
+    most_open = []
+    scandir = os.scandir
+
+    class CountingIterator(object):
+        def __init__(self, path):
+            self._iterator = scandir(path)
+            open_iterators.append(self)
+            most_open.append(len(open_iterators))
+
+        def __iter__(self):
+            return self
+
+        def __next__(self):
+            return next(self._iterator)
+
+        def close(self):
+            if self in open_iterators:
+                open_iterators.remove(self)
+            self._iterator.close()
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            self.close()
+
+    monkeypatch.setattr(os, 'scandir', CountingIterator)
+    rows = metadata.manifest_rows(str(dataset))
+    assert next(rows) == metadata.MANIFEST_HEADER
+    assert not most_open
+
+    first = next(rows)
+    assert first[0]
+    count = 1 + sum(1 for _ in rows)
+    assert count == 7 + depth * 5
+    assert not open_iterators
+    assert max(most_open) <= depth + 2
+
+
+def test_write_xlsx_metadata(dataset):
+    openpyxl = pytest.importorskip('openpyxl')
+    instance = populate('ScaffoldedVagus', [str(dataset)])
+    metadata.write_metadata(instance, file_format='xlsx')
+
+    workbook = openpyxl.load_workbook(dataset / 'subjects.xlsx', read_only=True)
+    rows = list(workbook.active.iter_rows(values_only=True))
+    assert rows[0] == tuple(metadata.SUBJECTS_HEADER)
+    assert sorted(row[0] for row in rows[1:]) == ['sub-0', 'sub-1']
@@ -0,0 +1,345 @@
+import copy
+import json
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from mapclientplugins.sdsprotocolstep import serialization
+from mapclientplugins.sdsprotocolstep import protocols as protocols_module
+from mapclientplugins.sdsprotocolstep.protocols import create_protocol_from_definition, get_protocol_by_name, \
+    get_protocol_matcher, IncrementalPopulator, LazyInput, load_protocol_definition, parse_cardinality, populate, \
+    ProtocolPopulationError, register_protocol, UNBOUNDED
+from mapclientplugins.sdsprotocolstep.storage import MemoryObjectStoreBackend
+
+
+def _make_directories(root, *names):
+    paths = []
+    for name in names:
+        path = root / name
+        path.mkdir(parents=True)
+        paths.append(str(path))
+
+    return paths
+
+
+def _make_json_file(root, name, content='{}'):
+    path = root / name
+    path.write_text(content)
+    return str(path)
+
+
+def _values(instance):
+    return [obj['value'] for obj in instance['inputs']]
+
+
+def test_parse_cardinality():
+    assert parse_cardinality('1') == (1, 1)
+    assert parse_cardinality('0..1') == (0, 1)
+    assert parse_cardinality('1..N') == (1, UNBOUNDED)
+    assert parse_cardinality('2..5') == (2, 5)
+    assert parse_cardinality('*') == (0, UNBOUNDED)
+    for invalid in ('', '0', '3..2', 'N', '1..x'):
+        with pytest.raises(ValueError):
+            parse_cardinality(invalid)
+
+
+def test_load_protocol_definition(tmp_path):
+    definition = {
+        'version': '1.0.0',
+        'name': 'PerSubject',
+        'slots': [
+            {'name': 'root', 'type': 'directory', 'destination': '.'},
+            {'name': 'subjects', 'type': 'directory', 'cardinality': '1..N'},
+            {'name': 'settings', 'type': 'identifier_file', 'mimetype': 'application/json', 'cardinality': '0..1'},
+        ]
+    }
+    file_name = tmp_path / 'protocol.json'
+    file_name.write_text(json.dumps(definition))
+    protocol = load_protocol_definition(str(file_name))
+
+    root, sub_1, sub_2 = _make_directories(tmp_path, 'dataset', 'sub-1', 'sub-2')
+    settings = _make_json_file(tmp_path, 'settings.json')
+    assert _values(populate(protocol, [root, sub_1, sub_2, settings])) == [root, [sub_1, sub_2], settings]
+    assert _values(populate(protocol, [root, sub_1])) == [root, [sub_1], None]
+    with pytest.raises(ProtocolPopulationError):
+        populate(protocol, [root])
+
+
+def test_unbounded_slot_leaves_items_for_later_slots(tmp_path):
+    protocol = create_protocol_from_definition({
+        'version': '1.0.0',
+        'name': 'Backtracking',
+        'slots': [
+            {'name': 'subjects', 'type': 'directory', 'cardinality': '1..N'},
+            {'name': 'web', 'type': 'directory'},
+        ]
+    })
+    sub_1, sub_2, web = _make_directories(tmp_path, 'sub-1', 'sub-2', 'web')
+
+    assert _values(populate(protocol, [sub_1, sub_2, web])) == [[sub_1, sub_2], web]
+    assert _values(populate(protocol, [sub_1, web])) == [[sub_1], web]
+    with pytest.raises(ProtocolPopulationError, match="Mandatory input 1 \\('web'\\)"):
+        populate(protocol, [sub_1])
+
+
+def test_matcher_uses_the_definition_passed_in(tmp_path):
+    directory_protocol = create_protocol_from_definition({
+        'version': '1.0.0', 'name': 'X', 'slots': [{'name': 'a', 'type': 'directory'}]})
+    file_protocol = create_protocol_from_definition({
+        'version': '1.0.0', 'name': 'X',
+        'slots': [{'name': 'a', 'type': 'identifier_file', 'mimetype': 'application/json'}]})
+    directory, = _make_directories(tmp_path, 'directory')
+    file_name = _make_json_file(tmp_path, 'a.json')
+
+    assert _values(populate(directory_protocol, [directory])) == [directory]
+    assert _values(populate(file_protocol, [file_name])) == [file_name]
+
+
+def test_matchers_are_cached_for_registered_protocols():
+    definition = {'version': '1.0.0', 'name': 'CachedMatcher', 'slots': [{'name': 'a', 'type': 'directory'}]}
+    ad_hoc = create_protocol_from_definition(definition)
+    assert get_protocol_matcher(ad_hoc) is not get_protocol_matcher(ad_hoc)
+    assert id(ad_hoc) not in protocols_module._matchers
+
+    original = create_protocol_from_definition(definition)
+    replacement = create_protocol_from_definition(definition)
+    try:
+        register_protocol(original)
+        matcher = get_protocol_matcher(original)
+        assert get_protocol_matcher(original) is matcher
+
+        register_protocol(replacement)
+        assert id(original) not in protocols_module._matchers
+        assert get_protocol_matcher(replacement) is not matcher
+        assert get_protocol_matcher(replacement) is get_protocol_matcher(replacement)
+    finally:
+        protocols_module.protocols.remove(replacement)
+        protocols_module._matchers.pop(id(replacement), None)
+
+
+def test_concurrent_populations_do_not_share_state(tmp_path):
+    data_sets = []
+    for k in range(40):
+        root, web = _make_directories(tmp_path, f'dataset-{k}', f'web-{k}')
+        files = [_make_json_file(tmp_path, f'settings-{k}-{n}.json') for n in range(4)]
+        data_sets.append([root] + files + [web, {'data set': k}])
+
+    def populate_data_set(k):
+        return k, populate('SimpleScaffold', data_sets[k])
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(populate_data_set, [k for _ in range(25) for k in range(len(data_sets))]))
+
+    assert len(results) == 1000
+    instances = set()
+    for k, instance in results:
+        root, *files, web, provenance = data_sets[k]
+        assert _values(instance) == [root] + files + [None, None, web, provenance]
+        instances.add(id(instance))
+    assert len(instances) == len(results)
+
+    registered = get_protocol_by_name('SimpleScaffold')
+    assert all(obj['value'] is None for obj in registered['inputs'])
+
+
+def _strict_protocol(name, settings_cardinality, next_slot_cardinality):
+    return create_protocol_from_definition({
+        'version': '1.0.0', 'name': name,
+        'slots': [
+            {'name': 'settings', 'type': 'identifier_file', 'mimetype': 'application/json', 'strict_mimetype': True,
+             'cardinality': settings_cardinality},
+            {'name': 'file', 'type': 'identifier_file', 'cardinality': next_slot_cardinality},
+        ]
+    })
+
+
+@pytest.mark.parametrize('next_slot_cardinality', ['1', '0..1'])
+def test_lazy_population_matches_eager_population(tmp_path, next_slot_cardinality):
+    protocol = _strict_protocol('LazyOutcome', '0..1', next_slot_cardinality)
+    not_json = _make_json_file(tmp_path, 'not.json', 'not json')
+    settings = _make_json_file(tmp_path, 'settings.json')
+
+    for data in ([not_json], [settings], [settings, not_json]):
+        eager = _values(populate(protocol, data))
+        assert _values(populate(protocol, data, lazy=True)) == eager
+
+
+def test_lazy_population_defers_content_checks():
+    store = MemoryObjectStoreBackend({'store/settings.json': b'not json', 'store/file.txt': b''})
+    protocol = _strict_protocol('LazyDeferred', '1', '1')
+
+    with pytest.raises(ProtocolPopulationError):
+        populate(protocol, ['store/settings.json', 'store/file.txt'], backend=store)
+
+    store.requests = 0
+    instance = populate(protocol, ['store/settings.json', 'store/file.txt'], lazy=True, backend=store)
+    assert store.requests == 1
+    assert isinstance(instance['inputs'][0], LazyInput)
+    assert instance['inputs'][1]['value'] == 'store/file.txt'
+    assert store.requests == 1
+    with pytest.raises(ProtocolPopulationError):
+        instance['inputs'][0]['value']
+    assert store.requests == 2
+    with pytest.raises(ProtocolPopulationError):
+        instance['inputs'][0].get('value')
+    assert store.requests == 2
+
+
+def test_lazy_population_scales_linearly(monkeypatch):
+    protocol = create_protocol_from_definition({
+        'version': '1.0.0', 'name': 'LazyScaling',
+        'slots': [
+            {'name': 'root', 'type': 'directory'},
+            {'name': 'settings', 'type': 'identifier_file', 'mimetype': 'application/json', 'strict_mimetype': True,
+             'cardinality': '1..N'},
+        ]
+    })
+    checks = []
+    is_valid_input = protocols_module._is_valid_input
+    monkeypatch.setattr(protocols_module, '_is_valid_input', lambda *args: checks.append(1) or is_valid_input(*args))
+
+    def lazy_checks(count):
+        objects = {f'store/settings-{n}.json': b'{}' for n in range(count)}
+        objects['store/root/readme.txt'] = b''
+        store = MemoryObjectStoreBackend(objects)
+        data = ['store/root'] + [f'store/settings-{n}.json' for n in range(count)]
+        checks.clear()
+        instance = populate(protocol, data, lazy=True, backend=store)
+        assert store.requests == 1
+        assert instance['inputs'][1]['value'] == data[1:]
+        return len(checks)
+
+    assert lazy_checks(2000) < 6 * lazy_checks(500)
+
+
+def test_lazy_input_access_paths():
+    store = MemoryObjectStoreBackend({'store/settings.json': b'not json', 'store/file.txt': b''})
+    protocol = _strict_protocol('LazyAccess', '1', '1')
+    instance = populate(protocol, ['store/settings.json', 'store/file.txt'], lazy=True, backend=store)
+    lazy_input = instance['inputs'][0]
+
+    for access in (lambda: list(lazy_input.items()), lambda: list(lazy_input.values()), lambda: json.dumps(instance),
+                   lambda: copy.deepcopy(instance), lambda: pickle.dumps(instance),
+                   lambda: serialization.dumps(instance)):
+        with pytest.raises(ProtocolPopulationError):
+            access()
+
+    # Copying with dict() bypasses the checks.
+    assert dict(lazy_input)['value'] == 'store/settings.json'
+
+
+def test_lazy_input_resolves_to_plain_dict():
+    store = MemoryObjectStoreBackend({'store/settings.json': b'{}', 'store/file.txt': b''})
+    protocol = _strict_protocol('LazyValid', '1', '1')
+    instance = populate(protocol, ['store/settings.json', 'store/file.txt'], lazy=True, backend=store)
+
+    assert json.loads(json.dumps(instance))['inputs'][0]['value'] == 'store/settings.json'
+    assert type(copy.deepcopy(instance)['inputs'][0]) is dict
+    assert type(pickle.loads(pickle.dumps(instance))['inputs'][0]) is dict
+
+
+def _scaffold_store():
+    objects = {f'store/settings-{n}.json': b'{}' for n in range(4)}
+    objects['store/dataset/readme.txt'] = b''
+    objects['store/web/index.html'] = b''
+    items = ['store/dataset'] + [f'store/settings-{n}.json' for n in range(4)] + ['store/web', {'provenance': 1}]
+    return objects, items
+
+
+def test_incremental_population_batches_requests():
+    objects, items = _scaffold_store()
+    store = MemoryObjectStoreBackend(objects)
+    expected = _values(populate('SimpleScaffold', items, backend=store))
+    assert store.requests == 1
+
+    store.requests = 0
+    populator = IncrementalPopulator('SimpleScaffold', backend=store, batch_delay=0.5)
+    for item in items:
+        populator.add(item)
+    assert _values(populator.finalise()) == expected
+    assert store.requests == 1
+
+
+def test_incremental_population_reads_content_like_populate():
+    protocol = _strict_protocol('IncrementalContent', '1', '1..N')
+    objects = {f'store/file-{n}.json': b'{}' for n in range(20)}
+    items = sorted(objects)
+    store = MemoryObjectStoreBackend(objects)
+    expected = _values(populate(protocol, items, backend=store))
+    assert store.requests == 2
+
+    store.requests = 0
+    populator = IncrementalPopulator(protocol, backend=store)
+    populator.add_all(items)
+    assert _values(populator.finalise()) == expected
+    assert store.requests == 2
+
+
+class _GatedStore(MemoryObjectStoreBackend):
+    """
+    Object store whose first stat_many call waits until it is released.
+    """
+
+    def __init__(self, objects):
+        super(_GatedStore, self).__init__(objects)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.batches = []
+
+    def stat_many(self, paths):
+        self.batches.append(list(paths))
+        if len(self.batches) == 1:
+            self.started.set()
+            assert self.release.wait(5)
+        return super(_GatedStore, self).stat_many(paths)
+
+
+def test_incremental_population_keeps_arrival_order():
+    objects, items = _scaffold_store()
+    store = _GatedStore(objects)
+    populator = IncrementalPopulator('SimpleScaffold', backend=store, batch_delay=0)
+    populator.add(items[0])
+    assert store.started.wait(5)
+    # These items arrive while the first batch is being validated.
+    for item in items[1:]:
+        populator.add(item)
+    store.release.set()
+
+    instance = populator.finalise()
+    assert store.batches == [items[:1], items[1:-1]]
+    assert _values(instance) == items[:5] + [None, None] + items[5:]
+
+
+def test_incremental_population_reports_errors():
+    objects, items = _scaffold_store()
+    populator = IncrementalPopulator('SimpleScaffold', backend=MemoryObjectStoreBackend(objects))
+    populator.add_all(items[:3])
+    with pytest.raises(ProtocolPopulationError, match='Ran out of data'):
+        populator.finalise()
+
+    class FailingStore(MemoryObjectStoreBackend):
+        def stat_many(self, paths):
+            raise ConnectionError('store unavailable')
+
+    populator = IncrementalPopulator('SimpleScaffold', backend=FailingStore(objects))
+    populator.add_all(items)
+    with pytest.raises(ProtocolPopulationError, match='store unavailable'):
+        populator.finalise()
+
+    with pytest.raises(ProtocolPopulationError, match='Unknown protocol'):
+        IncrementalPopulator('--')
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_incremental_population_matches_populate(tmp_path, lazy):
+    protocol = _strict_protocol('IncrementalOutcome', '0..1', '0..1')
+    not_json = _make_json_file(tmp_path, 'not.json', 'not json')
+    settings = _make_json_file(tmp_path, 'settings.json')
+
+    for data in ([not_json], [settings], [settings, not_json]):
+        populator = IncrementalPopulator(protocol, lazy=lazy)
+        for item in data:
+            populator.add(item)
+        assert _values(populator.finalise()) == _values(populate(protocol, data, lazy=lazy))
@@ -0,0 +1,88 @@
+import pickle
+import struct
+
+import pytest
+
+from mapclientplugins.sdsprotocolstep import serialization
+from mapclientplugins.sdsprotocolstep.protocols import create_protocol_from_definition, populate, \
+    ProtocolPopulationError
+
+
+@pytest.fixture
+def scaffold_data(tmp_path):
+    root = tmp_path / 'dataset'
+    web = tmp_path / 'web'
+    root.mkdir()
+    web.mkdir()
+    files = []
+    for n in range(4):
+        file_name = tmp_path / f'settings-{n}.json'
+        file_name.write_text('{}')
+        files.append(str(file_name))
+
+    return [str(root)] + files + [str(web)]
+
+
+def _round_trip(protocol, **kwargs):
+    buffers = []
+    encoded = serialization.dumps(protocol, buffer_callback=buffers.append, **kwargs)
+    return serialization.loads(encoded, buffers=buffers), buffers
+
+
+def test_round_trip_in_band(scaffold_data):
+    provenance = {'version': '1.0', 'steps': [{'id': k} for k in range(10)], 'blob': b'x' * 100}
+    instance = populate('SimpleScaffold', scaffold_data + [provenance])
+
+    decoded = serialization.loads(serialization.dumps(instance))
+    assert decoded == instance
+
+
+def test_round_trip_out_of_band(scaffold_data):
+    blob = b'x' * (100 * 1024)
+    provenance = {'version': '1.0', 'blob': blob, 'small': b'y'}
+    instance = populate('SimpleScaffold', scaffold_data + [provenance])
+
+    decoded, buffers = _round_trip(instance)
+    assert len(buffers) == 1
+    assert decoded == instance
+    decoded_blob = decoded['inputs'][8]['value']['blob']
+    assert isinstance(decoded_blob, memoryview)
+    assert decoded_blob.obj is blob
+    assert decoded['inputs'][8]['value']['small'] == b'y'
+
+
+def test_round_trip_memoryview(scaffold_data):
+    provenance = {'small': memoryview(b'abc'), 'strided': memoryview(b'abcdef')[::2]}
+    instance = populate('SimpleScaffold', scaffold_data + [provenance])
+
+    decoded = serialization.loads(serialization.dumps(instance))
+    assert decoded == instance
+    decoded, _ = _round_trip(instance)
+    assert decoded == instance
+
+
+def test_round_trip_unregistered_protocol(tmp_path):
+    protocol = create_protocol_from_definition({
+        'version': '1.0.0', 'name': 'Unregistered',
+        'slots': [{'name': 'directories', 'type': 'directory', 'cardinality': '1..N'}]})
+    instance = populate(protocol, [str(tmp_path)])
+
+    with pytest.raises(ProtocolPopulationError):
+        serialization.loads(serialization.dumps(instance))
+    assert serialization.loads(serialization.dumps(instance, include_definition=True)) == instance
+
+
+def test_encoding_is_compact(scaffold_data):
+    instance = populate('SimpleScaffold', scaffold_data + [{}])
+    assert len(serialization.dumps(instance)) < len(pickle.dumps(instance, protocol=5))
+
+
+def test_invalid_data(scaffold_data):
+    instance = populate('SimpleScaffold', scaffold_data + [{}])
+    encoded = serialization.dumps(instance)
+    with pytest.raises(ValueError):
+        serialization.loads(encoded[:3])
+    with pytest.raises(ValueError):
+        serialization.loads(b'XXXX' + encoded[4:])
+    with pytest.raises(ValueError):
+        serialization.loads(struct.pack('>4sB', serialization.MAGIC, 99) + encoded[5:])
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6 import QtCore
+
+from mapclientplugins.sdsprotocolstep.step import SDSProtocolStep
+
+
+@pytest.fixture(scope='module')
+def application():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+@pytest.fixture
+def data(tmp_path):
+    root = tmp_path / 'dataset'
+    root.mkdir()
+    return [str(root)]
+
+
+def _execute(step):
+    step._doneExecution = lambda: None
+    step.execute()
+    return step.getPortData(0)
+
+
+def test_data_set_before_configuration_is_kept(application, tmp_path, data):
+    step = SDSProtocolStep(str(tmp_path))
+    step.setPortData(1, data)
+    step._config['protocol_name'] = 'ScaffoldedVagus'
+
+    protocol = _execute(step)
+    assert protocol['name'] == 'ScaffoldedVagus'
+    assert protocol['inputs'][0]['value'] == data[0]
+
+
+def test_protocol_change_repopulates(application, tmp_path, data):
+    step = SDSProtocolStep(str(tmp_path))
+    step._config['protocol_name'] = 'SimpleScaffold'
+    step.setPortData(1, data)
+    step._config['protocol_name'] = 'ScaffoldedVagus'
+
+    assert _execute(step)['name'] == 'ScaffoldedVagus'
+
+
+def test_data_does_not_carry_over_between_runs(application, tmp_path, data):
+    step = SDSProtocolStep(str(tmp_path))
+    step._config['protocol_name'] = 'ScaffoldedVagus'
+
+    step.setPortData(1, data)
+    assert _execute(step)['inputs'][0]['value'] == data[0]
+
+    step.setPortData(1, data)
+    assert _execute(step)['inputs'][0]['value'] == data[0]
+
+    # A failed population also clears the data.
+    step.setPortData(1, data + data)
+    assert _execute(step) is None
+    step.setPortData(1, data)
+    assert _execute(step) is not None
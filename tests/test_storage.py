@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from mapclientplugins.sdsprotocolstep.protocols import populate
+from mapclientplugins.sdsprotocolstep.storage import DIRECTORY, FILE, LocalStorageBackend, MemoryObjectStoreBackend
+
+
+def test_local_storage_stat_many(tmp_path):
+    directory = tmp_path / 'directory'
+    directory.mkdir()
+    file_name = directory / 'file.json'
+    file_name.write_bytes(b'{}')
+    paths = [str(directory), str(file_name), str(tmp_path / 'missing'), 'invalid\0path']
+    expected = [DIRECTORY, FILE, None, None]
+    if hasattr(os, 'mkfifo'):
+        fifo = tmp_path / 'fifo'
+        os.mkfifo(fifo)
+        paths.append(str(fifo))
+        expected.append(None)
+
+    backend = LocalStorageBackend()
+    assert backend.stat_many(paths) == expected
+    assert backend.exists_many(paths) == [kind is not None for kind in expected]
+
+
+def test_local_storage_list_and_open(tmp_path):
+    (tmp_path / 'sub-1').mkdir()
+    (tmp_path / 'file.json').write_bytes(b'{}')
+
+    with LocalStorageBackend() as backend:
+        names, missing, not_directory = backend.list_many(
+            [str(tmp_path), str(tmp_path / 'missing'), str(tmp_path / 'file.json')])
+        assert sorted(names) == ['file.json', 'sub-1']
+        assert missing is None
+        assert not_directory is None
+        with backend.open(str(tmp_path / 'file.json')) as f:
+            assert f.read() == b'{}'
+        with pytest.raises(FileNotFoundError):
+            backend.open(str(tmp_path / 'missing'))
+
+
+def test_object_store_prefix_directories():
+    store = MemoryObjectStoreBackend({'store/dataset/primary/settings.json': b'{}', 'store/dataset/readme.txt': b''})
+    store.put('store/web/index.html', b'<html/>')
+
+    assert store.stat_many(['store', 'store/dataset', 'store/dataset/', 'store/dataset/primary',
+                            'store/dataset/readme.txt', 'store/data', 'store/missing']) == \
+        [DIRECTORY, DIRECTORY, DIRECTORY, DIRECTORY, FILE, None, None]
+    assert store.list_many(['store', 'store/dataset', 'store/dataset/readme.txt', 'store/missing']) == \
+        [['dataset', 'web'], ['primary', 'readme.txt'], None, None]
+    assert store.open('store/web/index.html').read() == b'<html/>'
+    with pytest.raises(FileNotFoundError):
+        store.open('store/dataset')
+    assert store.requests == 4
+
+
+def test_object_store_counts_requests_and_connections():
+    store = MemoryObjectStoreBackend({'store/file.txt': b''})
+    assert (store.requests, store.connections) == (0, 0)
+
+    store.stat_many(['store/file.txt', 'store/missing'])
+    store.list_many(['store'])
+    assert (store.requests, store.connections) == (2, 1)
+
+    store.close()
+    assert (store.requests, store.connections) == (2, 1)
+    with store:
+        store.exists_many(['store/file.txt'])
+        store.open('store/file.txt')
+    assert (store.requests, store.connections) == (4, 2)
+
+
+def test_populate_resolves_all_inputs_in_one_request():
+    objects = {f'store/settings-{n}.json': b'{}' for n in range(4)}
+    objects['store/dataset/readme.txt'] = b''
+    objects['store/web/index.html'] = b''
+    store = MemoryObjectStoreBackend(objects)
+    items = ['store/dataset'] + [f'store/settings-{n}.json' for n in range(4)] + ['store/web', {'provenance': 1}]
+
+    instance = populate('SimpleScaffold', items, backend=store)
+    assert len(instance['inputs']) == 9
+    assert instance['inputs'][7]['value'] == 'store/web'
+    assert (store.requests, store.connections) == (1, 1)